@@ -1,13 +1,17 @@
 import re
 import csv
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pdfplumber
 
 
 # ---------- helpers ----------
+HSPACE_RE = re.compile(r"[ \t]+")
+
 def clean(s: str) -> str:
-    return re.sub(r"[ \t]+", " ", (s or "").strip())
+    return HSPACE_RE.sub(" ", (s or "").strip())
 
 def find_labeled_value(text: str, label: str) -> str:
     """
@@ -28,55 +32,110 @@ def find_labeled_value(text: str, label: str) -> str:
 
     return ""
 
-def extract_ship_to(text: str):
+def compile_label_scan(labels) -> re.Pattern:
     """
-    CRITICAL: Always extract address fields from the “Ship To” section.
-    Assumes Ship To block like:
-
-      Ship To:
-      COMPANY NAME
-      123 MAIN ST
-      SUITE 400   (optional)
-      CITY, ST 12345
+    Builds one pattern that finds every "Label: value" / "Label   value"
+    line for all the given labels in a single pass over the text.
+    The lookahead keeps matches zero-width, so a value that spills onto
+    the next line can't hide a label sitting on that line.
+    """
+    alts = "|".join(re.escape(l) for l in sorted(labels, key=len, reverse=True))
+    return re.compile(
+        rf"(?im)^(?=\s*(?P<label>{alts})(?:\s*:\s*(?P<colon>.+?)|\s{{2,}}(?P<spaced>.+?))\s*$)"
+    )
 
-    Returns: (company, street_address, city, state, zip)
+def scan_labeled_values(pattern: re.Pattern, text: str) -> tuple:
+    """
+    Runs a compile_label_scan() pattern once over text.
+    Returns ({lowercased label: value} for the first "Label: value" hits,
+    same for the first "Label   value" hits); like find_labeled_value,
+    callers should prefer the colon form.
     """
-    # Grab lines and locate the Ship To header line
-    lines = [clean(l) for l in text.splitlines()]
-    ship_idx = None
-    for i, line in enumerate(lines):
-        if re.fullmatch(r"(?i)ship\s*to\s*:?", line):
-            ship_idx = i
+    colon, spaced = {}, {}
+    for m in pattern.finditer(text):
+        label = m.group("label").lower()
+        if m.group("colon") is not None:
+            colon.setdefault(label, clean(m.group("colon")))
+        else:
+            spaced.setdefault(label, clean(m.group("spaced")))
+    return (colon, spaced)
+
+SHIP_TO_HINT_RE = re.compile(r"(?i)ship\s*to")
+SHIP_TO_HEADER_RE = re.compile(r"(?i)ship\s*to\s*:?")
+
+# The Ship To block ends at a common next-section header (adjustable)
+# or at another label style line like "X: Y"; one pattern checks both.
+SHIP_TO_END_RE = re.compile(
+    r"(?i)^(?:(?:bill\s*to|sold\s*to|remit\s*to|terms|notes|ship\s*via|quote|customer|cust\s*#|salesperson|quoted\s*by)\b"
+    r"|[A-Za-z][A-Za-z \/#&\.-]{2,}:\s*\S+)"
+)
+
+# "City, ST 12345" or "City ST 12345"; block lines are already stripped,
+# so this is applied with fullmatch rather than ^...$ anchors.
+CITY_STATE_ZIP_RE = re.compile(r"(?P<city>.+?)[,\s]+(?P<state>[A-Z]{2})\s+(?P<zip>\d{5}(?:-\d{4})?)")
+
+def find_ship_to_block(text: str):
+    """
+    Returns (block, closed): the cleaned lines of the first Ship To block,
+    and whether the block was closed by a stopping condition rather than
+    by running out of text (i.e. more text after it can't change it).
+    """
+    # Cheap pre-check: no "ship to" anywhere means no header line either
+    hint = SHIP_TO_HINT_RE.search(text)
+    if not hint:
+        return ([], False)
+
+    # Grab lines and locate the Ship To header line. It can't come before
+    # the first hint, so start from that line; lines are cleaned lazily so
+    # nothing past the end of the block gets touched either.
+    start = text.rfind("\n", 0, hint.start()) + 1
+    lines = (clean(l) for l in text[start:].splitlines())
+    for line in lines:
+        if SHIP_TO_HEADER_RE.fullmatch(line):
             break
-
-    if ship_idx is None:
-        return ("", "", "", "", "")
+    else:
+        return ([], False)
 
     # Collect following non-empty lines until a stopping condition
-    # Stop if we hit common next-section headers (adjustable)
-    stop_headers = re.compile(
-        r"(?i)^(bill\s*to|sold\s*to|remit\s*to|terms|notes|ship\s*via|quote|customer|cust\s*#|salesperson|quoted\s*by)\b"
-    )
-
     block = []
-    for j in range(ship_idx + 1, len(lines)):
-        if not lines[j]:
+    for line in lines:
+        if not line:
             # allow a single blank inside, but break on multiple blanks after some content
             if block:
                 # peek ahead: if next non-empty is a header, stop
                 continue
             else:
                 continue
-        if stop_headers.match(lines[j]) and block:
-            break
-        # Also stop if we hit another label style line like "X: Y" after collecting something
-        if block and re.match(r"(?i)^[A-Za-z][A-Za-z \/#&\.-]{2,}:\s*\S+", lines[j]):
-            break
-        block.append(lines[j])
+        # Once we have content, stop at the next section or label line
+        if block and SHIP_TO_END_RE.match(line):
+            return (block, True)
+        block.append(line)
         # safety: don't let it run too far
         if len(block) >= 8:
-            break
+            return (block, True)
+
+    return (block, False)
+
+def extract_ship_to(text: str):
+    """
+    CRITICAL: Always extract address fields from the “Ship To” section.
+    Assumes Ship To block like:
+
+      Ship To:
+      COMPANY NAME
+      123 MAIN ST
+      SUITE 400   (optional)
+      CITY, ST 12345
+
+    Returns: (company, street_address, city, state, zip)
+    """
+    block, _ = find_ship_to_block(text)
+    return address_from_block(block)
 
+def address_from_block(block):
+    """
+    Splits Ship To block lines into (company, street_address, city, state, zip).
+    """
     if not block:
         return ("", "", "", "", "")
 
@@ -88,7 +147,7 @@ def extract_ship_to(text: str):
 
     # Try from bottom up to find "City, ST 12345" OR "City ST 12345"
     for k in range(len(block) - 1, -1, -1):
-        m = re.match(r"^(?P<city>.+?)[,\s]+(?P<state>[A-Z]{2})\s+(?P<zip>\d{5}(?:-\d{4})?)$", block[k])
+        m = CITY_STATE_ZIP_RE.fullmatch(block[k])
         if m:
             city = clean(m.group("city").rstrip(","))
             state = m.group("state")
@@ -108,68 +167,133 @@ def extract_ship_to(text: str):
 
     return (company, street_address, city, state, zip_code)
 
+def page_texts(pdf):
+    """
+    Text of each non-blank page of an open pdfplumber PDF, extracted lazily.
+    """
+    for page in pdf.pages:
+        t = page.extract_text() or ""
+        if t.strip():
+            yield t
+
 def extract_pdf_text(pdf_path: Path) -> str:
     # Most Voelkr PDFs are text-based; if some are scanned images, this won’t work without OCR.
-    parts = []
     with pdfplumber.open(str(pdf_path)) as pdf:
-        for page in pdf.pages:
-            t = page.extract_text() or ""
-            if t.strip():
-                parts.append(t)
-    return "\n".join(parts)
+        return "\n".join(page_texts(pdf))
 
 
 # ---------- main extraction ----------
-def extract_fields_from_pdf(pdf_path: Path) -> dict:
-    text = extract_pdf_text(pdf_path)
-
-    company, ship_addr, city, state, zip_code = extract_ship_to(text)
-
-    # Label-based fields (tweak labels if your PDFs use different wording)
-    salesperson = find_labeled_value(text, "Salesperson")
-    quoted_by = find_labeled_value(text, "Quoted By")
-
-    # Customer number label variants
-    cust_num = (
-        find_labeled_value(text, "Cust #")
-        or find_labeled_value(text, "Cust#")
-        or find_labeled_value(text, "Customer #")
-        or find_labeled_value(text, "Customer#")
+# Label-based fields (tweak labels if your PDFs use different wording).
+# Each column lists its label variants in priority order.
+FIELD_LABELS = {
+    "Salesperson": ("Salesperson",),
+    "Quoted By": ("Quoted By",),
+    "Cust #": ("Cust #", "Cust#", "Customer #", "Customer#"),
+}
+FIELD_LABELS_RE = compile_label_scan(
+    [label for variants in FIELD_LABELS.values() for label in variants]
+)
+
+def parse_fields(text: str):
+    """
+    Returns (fields, settled). settled means no text appended after `text`
+    could change the fields: the Ship To block is closed and every column
+    has a "Label: value" hit for its top-priority label.
+    """
+    block, ship_to_closed = find_ship_to_block(text)
+    company, ship_addr, city, state, zip_code = address_from_block(block)
+
+    # One pass over the text for all labels instead of one search per label
+    colon, spaced = scan_labeled_values(FIELD_LABELS_RE, text)
+    found = {**spaced, **colon}
+    labeled = {
+        col: next((found[l.lower()] for l in variants if found.get(l.lower())), "")
+        for col, variants in FIELD_LABELS.items()
+    }
+    settled = ship_to_closed and all(
+        colon.get(variants[0].lower()) for variants in FIELD_LABELS.values()
     )
 
-    return {
-        "File": pdf_path.name,
+    fields = {
         "Company": company,
         "Ship To Address": ship_addr,
         "City": city,
         "State": state,
         "Zip": zip_code,
-        "Salesperson": salesperson,
-        "Quoted By": quoted_by,
-        "Cust #": cust_num,
+        **labeled,
     }
+    return (fields, settled)
 
-def run_batch(input_folder: str, output_csv: str):
+def extract_fields_from_pdf(pdf_path: Path) -> dict:
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        pages = page_texts(pdf)
+        # The header fields are normally all on page 1; only parse the rest
+        # of the document when page 1 alone can't settle them.
+        first = next(pages, "")
+        fields, settled = parse_fields(first)
+        if not settled:
+            fields, _ = parse_fields("\n".join([first, *pages]))
+    return {"File": pdf_path.name, **fields}
+
+def extract_row(pdf_path: Path) -> dict:
+    """
+    Worker entry point for run_batch: the fields for one PDF, or an
+    empty row carrying the error if it can't be parsed.
+    """
+    try:
+        return extract_fields_from_pdf(pdf_path)
+    except Exception as e:
+        return {
+            "File": pdf_path.name,
+            "Company": "",
+            "Ship To Address": "",
+            "City": "",
+            "State": "",
+            "Zip": "",
+            "Salesperson": "",
+            "Quoted By": "",
+            "Cust #": "",
+            "Error": str(e),
+        }
+
+def content_key(pdf_path: Path) -> str:
+    # Hash in chunks so large PDFs are never held in memory whole
+    h = hashlib.sha256()
+    try:
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    except OSError:
+        # unreadable: keep it distinct and let extract_row report the error
+        return str(pdf_path)
+
+def run_batch(input_folder: str, output_csv: str, max_workers=None):
     input_path = Path(input_folder)
     pdfs = sorted(input_path.glob("*.pdf"))
 
-    rows = []
-    for pdf in pdfs:
-        try:
-            rows.append(extract_fields_from_pdf(pdf))
-        except Exception as e:
-            rows.append({
-                "File": pdf.name,
-                "Company": "",
-                "Ship To Address": "",
-                "City": "",
-                "State": "",
-                "Zip": "",
-                "Salesperson": "",
-                "Quoted By": "",
-                "Cust #": "",
-                "Error": str(e),
-            })
+    # pdfplumber parsing is CPU-bound pure Python, so fan out over processes
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        # Duplicate PDFs share a content hash, so each distinct file is
+        # parsed once; the hashing itself also runs on the pool
+        keys = list(ex.map(content_key, pdfs))
+        unique = {}
+        for key, pdf in zip(keys, pdfs):
+            unique.setdefault(key, pdf)
+        parsed = dict(zip(unique, ex.map(extract_row, unique.values())))
+
+        # Only successful parses are shared: a copy of a file that failed
+        # gets its own attempt, so its Error is about that file
+        retry = [
+            pdf for key, pdf in zip(keys, pdfs)
+            if parsed[key].get("Error") and unique[key] is not pdf
+        ]
+        retried = dict(zip(retry, ex.map(extract_row, retry)))
+
+    rows = [
+        retried[pdf] if pdf in retried else {**parsed[key], "File": pdf.name}
+        for key, pdf in zip(keys, pdfs)
+    ]
 
     fieldnames = [
         "File", "Company", "Ship To Address", "City", "State", "Zip",